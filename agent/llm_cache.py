@@ -0,0 +1,93 @@
+"""
+Two-level prompt/response cache for DSPy module calls.
+
+Repeated (module, inputs) pairs — evaluation sweeps, repeated dashboard
+questions, the repair loop replaying an identical prompt — return from a
+dict lookup or a local disk read instead of re-paying a full LM decode.
+The in-process layer serves hot keys without touching disk; the diskcache
+layer (optional dependency) survives process restarts.
+"""
+
+import hashlib
+import json
+import threading
+
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+
+_DISK_CACHE = diskcache.Cache("./.llm_cache", size_limit=1 << 30) if diskcache else None
+_MEMORY_CACHE = {}
+_MEMORY_CACHE_MAX = 1024
+_LOCK = threading.Lock()
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+
+def make_key(module_name: str, inputs: dict) -> str:
+    """
+    Compute a stable hash for a module name and its keyword inputs.
+
+    Args:
+        module_name: Identifier for the caller (module + model name)
+        inputs: Keyword inputs of the call
+
+    Returns:
+        Hex digest usable as a cache key
+    """
+    payload = json.dumps({"m": module_name, "i": inputs}, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode()).hexdigest()
+
+
+def cached_call(module_name: str, inputs: dict, fn, ttl: int = DEFAULT_TTL_SECONDS):
+    """
+    Return the cached result for (module_name, inputs) or compute and store it.
+
+    Checks the in-memory layer, then disk, then runs fn() and populates
+    both layers.
+
+    Args:
+        module_name: Identifier for the caller (module + model name)
+        inputs: Keyword inputs of the call
+        fn: Zero-argument callable producing the result on a cache miss
+        ttl: Disk-entry lifetime in seconds
+
+    Returns:
+        The cached or freshly computed result
+    """
+    key = make_key(module_name, inputs)
+
+    with _LOCK:
+        if key in _MEMORY_CACHE:
+            return _MEMORY_CACHE[key]
+
+    if _DISK_CACHE is not None:
+        hit = _DISK_CACHE.get(key)
+        if hit is not None:
+            _remember(key, hit)
+            return hit
+
+    result = fn()
+    _remember(key, result)
+    if _DISK_CACHE is not None:
+        _DISK_CACHE.set(key, result, expire=ttl)
+    return result
+
+
+def clear() -> None:
+    """Drop both cache levels (for tests and development)."""
+    with _LOCK:
+        _MEMORY_CACHE.clear()
+    if _DISK_CACHE is not None:
+        _DISK_CACHE.clear()
+
+
+def _remember(key: str, value) -> None:
+    """Store a value in the bounded in-memory layer."""
+    with _LOCK:
+        if len(_MEMORY_CACHE) >= _MEMORY_CACHE_MAX:
+            # Evict the oldest insertion (dicts preserve insertion order)
+            _MEMORY_CACHE.pop(next(iter(_MEMORY_CACHE)))
+        _MEMORY_CACHE[key] = value
@@ -21,8 +21,10 @@ from agent.dspy_signatures import SQLGeneratorSignature
 # Initialize database tool
 db_tool = SQLiteTool(db_path="data/northwind.sqlite")
 
-# Get schema for training examples
-SCHEMA = db_tool.get_schema()
+# Get schema for training examples. Interned so the five examples (and
+# every bootstrap trial built from them) share one string object instead
+# of carrying independent copies of the schema text.
+SCHEMA = sys.intern(db_tool.get_schema())
 
 
 # Training Data: 5 handcrafted examples
@@ -94,8 +96,10 @@ def validate_sql(example, prediction, trace=None):
     """
     # Get the predicted SQL query
     predicted_sql = prediction.sql_query if hasattr(prediction, 'sql_query') else str(prediction)
-    
-    # Try to execute the SQL
+
+    # Try to execute the SQL. SQLiteTool caches read-query results, so
+    # identical queries replayed across bootstrap trials don't re-hit the
+    # database.
     result = db_tool.execute_query(predicted_sql)
     
     # Check if execution was successful (no error)
@@ -1,9 +1,47 @@
+import functools
+import hashlib
+import logging
 import os
+import pickle
 import re
-from typing import List, Dict
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple
+import numpy as np
 from rank_bm25 import BM25Okapi
 
 
+log = logging.getLogger(__name__)
+
+
+# Compiled once: tokenization runs for every chunk at index time and for
+# every query at search time
+_TOKEN_RE = re.compile(r'\w+')
+
+# Translation table sending every non-word Latin-1 character to a space:
+# lower/translate/split tokenizes in three C-level passes with no regex
+# machinery per call
+_TRANS = str.maketrans({
+    c: ' ' for c in map(chr, range(256)) if not (c.isalnum() or c == '_')
+})
+
+
+def _fast_tokenize(text: str) -> List[str]:
+    """Tokenize via translate+split; regex fallback for non-ASCII text
+    the translation table doesn't cover."""
+    lowered = text.lower()
+    if lowered.isascii():
+        return lowered.translate(_TRANS).split()
+    return _TOKEN_RE.findall(lowered)
+
+
+@functools.lru_cache(maxsize=512)
+def _tokenize_cached(text: str) -> tuple:
+    """Memoized tokenization for the query path (tuple result so it can
+    live in the lru_cache)."""
+    return tuple(_fast_tokenize(text))
+
+
 class LocalRetriever:
     """Retriever for local markdown documentation using BM25."""
     
@@ -15,26 +53,84 @@ class LocalRetriever:
             docs_path: Path to folder containing .md files
         """
         self.docs_path = docs_path
-        self.chunks = []
+        # Parallel arrays (doc_ids[i] goes with contents[i]): top-k
+        # assembly touches only the ids, not per-chunk dicts
+        self.doc_ids = []
+        self.contents = []
         self.bm25 = None
         self._load_and_index_docs()
     
     def _load_and_index_docs(self):
-        """Load markdown files and create BM25 index."""
+        """Load markdown files and create BM25 index (cached on disk)."""
         if not os.path.exists(self.docs_path):
-            print(f"Warning: Documentation path '{self.docs_path}' does not exist.")
+            log.warning("Documentation path '%s' does not exist.", self.docs_path)
             return
-        
+
+        # Reuse a pickled index when the docs haven't changed: startup is
+        # then one disk read instead of re-chunking and re-tokenizing the
+        # whole corpus. The fingerprint covers file names and mtimes, so
+        # any edit, add or delete rebuilds the index.
+        cache_path = os.path.join(
+            self.docs_path, f".bm25_{self._docs_fingerprint()}.pkl"
+        )
+        if self._load_cached_index(cache_path):
+            return
+
         # Load all .md files
         for filename in os.listdir(self.docs_path):
             if filename.endswith('.md'):
                 filepath = os.path.join(self.docs_path, filename)
                 self._load_file(filepath, filename)
-        
+
         # Create BM25 index
-        if self.chunks:
-            tokenized_chunks = [self._tokenize(chunk['content']) for chunk in self.chunks]
+        if self.contents:
+            tokenized_chunks = [self._tokenize(content) for content in self.contents]
             self.bm25 = BM25Okapi(tokenized_chunks)
+            try:
+                with open(cache_path, 'wb') as f:
+                    pickle.dump(
+                        (self.doc_ids, self.contents, self.bm25),
+                        f, protocol=pickle.HIGHEST_PROTOCOL
+                    )
+            except OSError as e:
+                log.warning("could not persist BM25 index: %s", e)
+
+    # Bumped when chunking/tokenization changes, so stale pickled indexes
+    # built under the old scheme are not reused
+    _INDEX_VERSION = 2
+
+    def _docs_fingerprint(self) -> str:
+        """Hash of .md file names and mtimes, used to key the index cache."""
+        entries = sorted(
+            (name, os.path.getmtime(os.path.join(self.docs_path, name)))
+            for name in os.listdir(self.docs_path)
+            if name.endswith('.md')
+        )
+        return hashlib.sha1(repr((self._INDEX_VERSION, entries)).encode()).hexdigest()
+
+    def _load_cached_index(self, cache_path: str) -> bool:
+        """
+        Restore (doc_ids, contents, bm25) from a pickled index if present.
+
+        Args:
+            cache_path: Fingerprint-keyed pickle path
+
+        Returns:
+            True when the cached index was loaded
+        """
+        if not os.path.exists(cache_path):
+            return False
+        try:
+            with open(cache_path, 'rb') as f:
+                doc_ids, contents, bm25 = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError) as e:
+            log.warning("stale BM25 index cache ignored: %s", e)
+            return False
+
+        self.doc_ids = [sys.intern(doc_id) for doc_id in doc_ids]
+        self.contents = contents
+        self.bm25 = bm25
+        return True
     
     def _load_file(self, filepath: str, filename: str):
         """
@@ -49,43 +145,43 @@ class LocalRetriever:
                 content = f.read()
             
             # Chunk the content
-            file_chunks = self._chunk_content(content, filename)
-            self.chunks.extend(file_chunks)
-            
+            doc_ids, contents = self._chunk_content(content, filename)
+            self.doc_ids.extend(doc_ids)
+            self.contents.extend(contents)
+
         except Exception as e:
-            print(f"Error loading file {filepath}: {str(e)}")
+            log.error("Error loading file %s: %s", filepath, e)
     
-    def _chunk_content(self, content: str, filename: str) -> List[Dict[str, str]]:
+    def _chunk_content(self, content: str, filename: str) -> Tuple[List[str], List[str]]:
         """
         Chunk content by markdown headers (##) or double newlines.
-        
+
         Args:
             content: File content to chunk
             filename: Name of the file
-            
+
         Returns:
-            List of chunks with doc_id and content
+            Pair of parallel lists: (doc_ids, contents)
         """
-        chunks = []
-        
+        doc_ids = []
+        contents = []
+
         # Try splitting by markdown headers first
         header_pattern = r'\n##\s+'
         sections = re.split(header_pattern, content)
-        
+
         # If no headers found, split by double newlines
         if len(sections) <= 1:
             sections = content.split('\n\n')
-        
+
         for idx, section in enumerate(sections):
             section = section.strip()
             if section:  # Skip empty chunks
-                doc_id = f"{filename}::chunk_{idx}"
-                chunks.append({
-                    "doc_id": doc_id,
-                    "content": section
-                })
-        
-        return chunks
+                # Interned: few unique ids, shared across repeat results
+                doc_ids.append(sys.intern(f"{filename}::chunk_{idx}"))
+                contents.append(section)
+
+        return doc_ids, contents
     
     def _tokenize(self, text: str) -> List[str]:
         """
@@ -98,8 +194,7 @@ class LocalRetriever:
             List of tokens
         """
         # Convert to lowercase and split on non-alphanumeric characters
-        tokens = re.findall(r'\w+', text.lower())
-        return tokens
+        return _fast_tokenize(text)
     
     def search(self, query: str, k: int = 3) -> List[Dict[str, str]]:
         """
@@ -112,24 +207,62 @@ class LocalRetriever:
         Returns:
             List of dictionaries with 'doc_id' and 'content' keys
         """
-        if not self.bm25 or not self.chunks:
+        if not self.bm25 or not self.contents:
             return []
-        
-        # Tokenize query
-        tokenized_query = self._tokenize(query)
-        
+
+        # Tokenize query (memoized — repeat questions skip retokenization)
+        tokenized_query = list(_tokenize_cached(query))
+
         # Get BM25 scores
-        scores = self.bm25.get_scores(tokenized_query)
-        
-        # Get top k indices
-        top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
-        
-        # Return top k chunks
-        results = []
-        for idx in top_indices:
-            results.append({
-                "doc_id": self.chunks[idx]["doc_id"],
-                "content": self.chunks[idx]["content"]
-            })
-        
-        return results
+        scores = np.asarray(self.bm25.get_scores(tokenized_query))
+        return self._top_k_chunks(scores, k)
+
+    def batch_search(self, queries: List[str], k: int = 3) -> List[List[Dict[str, str]]]:
+        """
+        Search many queries at once (for evaluation / bulk runs).
+
+        Scoring runs on a small thread pool — BM25Okapi's scoring is
+        numpy work that releases the GIL, so queries overlap instead of
+        re-scoring the corpus strictly one at a time.
+
+        Args:
+            queries: Search queries
+            k: Number of top results per query
+
+        Returns:
+            One result list per query, in input order
+        """
+        if not self.bm25 or not self.contents:
+            return [[] for _ in queries]
+
+        def _one(query: str) -> List[Dict[str, str]]:
+            scores = np.asarray(self.bm25.get_scores(list(_tokenize_cached(query))))
+            return self._top_k_chunks(scores, k)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            return list(pool.map(_one, queries))
+
+    def _top_k_chunks(self, scores, k: int) -> List[Dict[str, str]]:
+        """
+        Pick the k best-scoring chunks.
+
+        O(N) partial selection instead of sorting every chunk's score,
+        then order just the k winners.
+
+        Args:
+            scores: numpy array of BM25 scores, one per chunk
+            k: Number of results
+
+        Returns:
+            Result dicts with 'doc_id' and 'content', best first
+        """
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top_unsorted = np.argpartition(-scores, k - 1)[:k]
+        top_indices = top_unsorted[np.argsort(-scores[top_unsorted])]
+
+        return [
+            {"doc_id": self.doc_ids[idx], "content": self.contents[idx]}
+            for idx in top_indices
+        ]
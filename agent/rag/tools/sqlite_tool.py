@@ -1,6 +1,15 @@
+import copy
+import itertools
 import sqlite3
 from typing import Dict, List, Any
 
+try:
+    # Optional: thinner SQLite binding (no Python converter layer per
+    # row), used automatically when installed
+    import apsw
+except ImportError:
+    apsw = None
+
 
 class SQLiteTool:
     """Tool for interacting with the Northwind SQLite database."""
@@ -8,76 +17,139 @@ class SQLiteTool:
     def __init__(self, db_path: str = "data/northwind.sqlite"):
         """
         Initialize the SQLite tool.
-        
+
+        Keeps one long-lived connection for the lifetime of the tool so the
+        hot agent loop (including SQL repair retries) does not pay
+        connect + pager warmup per query, and caches the schema text,
+        which is static for a run.
+
         Args:
             db_path: Path to the SQLite database file
         """
         self.db_path = db_path
-    
+        self._schema_cache = None
+        # Session-level cache of read-query results: the repair loop and
+        # repeated questions often replay the exact same SQL
+        self._result_cache = {}
+        if apsw is not None:
+            # Default (serialized) threading mode: this tool is a shared
+            # singleton, so the connection is hit from the batch and
+            # hybrid fan-out thread pools and needs SQLite's own mutex
+            self._conn = apsw.Connection(
+                db_path,
+                flags=apsw.SQLITE_OPEN_READWRITE
+            )
+        else:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        # Read-mostly workload: WAL lets readers proceed concurrently,
+        # the larger page cache keeps the small database in memory, and
+        # mmap serves pages straight from the OS cache
+        cursor = self._conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-65536")
+        cursor.execute("PRAGMA mmap_size=268435456")
+
     def get_schema(self) -> str:
         """
         Get the CREATE statements for the main tables.
-        
+
+        The result is computed once per instance and cached — sql_gen_node
+        asks for the schema on every generation attempt.
+
         Returns:
-            String containing CREATE TABLE/VIEW statements for Orders, Order Details, 
+            String containing CREATE TABLE/VIEW statements for Orders, Order Details,
             Products, and Customers tables.
         """
+        if self._schema_cache is not None:
+            return self._schema_cache
+
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             tables = ['Orders', 'Order Details', 'Products', 'Customers']
-            schema_statements = []
-            
-            for table in tables:
-                # Query sqlite_master for the CREATE statement
-                cursor.execute(
-                    "SELECT sql FROM sqlite_master WHERE name = ? AND type IN ('table', 'view')",
-                    (table,)
-                )
-                result = cursor.fetchone()
-                if result:
-                    schema_statements.append(result[0])
-            
-            conn.close()
-            return "\n\n".join(schema_statements)
-        
+            placeholders = ", ".join("?" for _ in tables)
+
+            # Single sqlite_master lookup for all tables
+            cursor = self._conn.cursor()
+            cursor.execute(
+                f"SELECT name, sql FROM sqlite_master WHERE name IN ({placeholders}) AND type IN ('table', 'view')",
+                tables
+            )
+            statements = {name: sql for name, sql in cursor.fetchall()}
+
+            self._schema_cache = "\n\n".join(
+                statements[table] for table in tables if table in statements
+            )
+            return self._schema_cache
+
         except Exception as e:
             return f"Error retrieving schema: {str(e)}"
     
-    def execute_query(self, sql: str) -> Dict[str, Any]:
+    def execute_query(self, sql: str, max_rows: int = 500) -> Dict[str, Any]:
         """
         Execute a SQL query and return results.
-        
+
+        Row materialization is capped at max_rows so a runaway wide scan
+        neither balloons Python memory nor floods the synthesizer prompt;
+        aggregates and normal analytic queries never hit the cap.
+
         Args:
             sql: SQL query to execute
-            
+            max_rows: Maximum number of rows to materialize
+
         Returns:
             Dictionary with keys:
             - columns: List of column names
             - rows: List of rows (each row is a list of values)
+            - truncated: True if the query produced more than max_rows rows
             - error: Error message if any, empty string otherwise
         """
+        key = (sql.strip(), max_rows)
+        is_read = key[0].upper().startswith(("SELECT", "WITH", "PRAGMA", "EXPLAIN"))
+
+        if is_read:
+            cached = self._result_cache.get(key)
+            if cached is not None:
+                # Deep copy so callers can't mutate the cached rows
+                return copy.deepcopy(cached)
+
         result = {
             "columns": [],
             "rows": [],
+            "truncated": False,
             "error": ""
         }
-        
+
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
+            cursor = self._conn.cursor()
             cursor.execute(sql)
-            
-            # Get column names from cursor description
-            if cursor.description:
-                result["columns"] = [desc[0] for desc in cursor.description]
-                result["rows"] = cursor.fetchall()
-            
-            conn.close()
-            
+
+            # Get column names from cursor description (apsw raises on
+            # statements that return no rows, sqlite3 returns None)
+            try:
+                description = cursor.description
+            except Exception:
+                description = None
+            if description:
+                result["columns"] = [desc[0] for desc in description]
+                # islice works on both cursor types (apsw has no
+                # fetchmany); one extra fetch detects whether the cap
+                # actually cut anything off
+                result["rows"] = list(itertools.islice(cursor, max_rows))
+                result["truncated"] = next(iter(cursor), None) is not None
+
+            if is_read:
+                if len(self._result_cache) < 128:
+                    self._result_cache[key] = copy.deepcopy(result)
+            else:
+                # Writes may change any cached result
+                self.invalidate()
+
         except Exception as e:
             result["error"] = str(e)
-        
+
         return result
+
+    def invalidate(self) -> None:
+        """Drop all cached query results (called after any write)."""
+        self._result_cache.clear()
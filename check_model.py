@@ -27,6 +27,7 @@ print(f"  Size: {os.path.getsize(model_path) / (1024**3):.2f} GB")
 print("\nLoading DSPy with llama-cpp-python...")
 try:
     from agent import dspy_signatures
+    dspy_signatures.configure_dspy()  # Model loads lazily; trigger it here
     print("✓ DSPy configuration loaded successfully")
 except Exception as e:
     print(f"✗ Error loading DSPy: {e}")
@@ -3,8 +3,10 @@ import sqlite3
 conn = sqlite3.connect('agent/rag/northwind.db')
 c = conn.cursor()
 
-# Test the exact query
-query = "SELECT COUNT(DISTINCT OrderID) AS NumberOfOrders FROM Orders WHERE strftime('%Y', OrderDate) = '1997';"
+# Test the exact query. Range predicate instead of strftime('%Y', ...):
+# wrapping OrderDate in a function forces a full scan, while a plain
+# range on the ISO-8601 text column can use idx_orders_date
+query = "SELECT COUNT(DISTINCT OrderID) AS NumberOfOrders FROM Orders WHERE OrderDate >= '1997-01-01' AND OrderDate < '1998-01-01';"
 c.execute(query)
 result = c.fetchall()
 print(f"Query result: {result}")
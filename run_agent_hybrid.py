@@ -5,123 +5,171 @@ Processes batch questions from JSONL and outputs structured results.
 """
 
 import argparse
+import asyncio
 import json
 import ast
+import re
 import sys
 import os
-from typing import Any, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List
+
+# Compiled once: parse_final_answer runs after every LLM call in a batch
+_INT_RE = re.compile(r'-?\d+')
+_FLOAT_RE = re.compile(r'-?\d+\.?\d*')
+
+try:
+    # Optional: C-level JSON parser/serializer for the batch I/O paths
+    import orjson
+except ImportError:
+    orjson = None
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+def _dump_line(result: Dict[str, Any]) -> str:
+    """Serialize one output record to a JSON string."""
+    if orjson is not None:
+        return orjson.dumps(result).decode()
+    return json.dumps(result)
 
 # Add current directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from agent.graph_hybrid import app
+# The compiled graph is imported lazily in main(): pulling it in
+# transitively loads dspy, langgraph, llama-cpp and numpy, which --help
+# runs and argparse/input errors should never pay for
+app = None
+
+
+def _parse_int(answer_str: str) -> int:
+    """Parse an int answer, extracting the first number from prose."""
+    try:
+        numbers = _INT_RE.findall(answer_str)
+        if numbers:
+            return int(numbers[0])
+        return int(answer_str)
+    except (ValueError, IndexError):
+        return 0
+
+
+def _parse_float(answer_str: str) -> float:
+    """Parse a float answer, extracting the first number from prose."""
+    try:
+        numbers = _FLOAT_RE.findall(answer_str)
+        if numbers:
+            return float(numbers[0])
+        return float(answer_str)
+    except (ValueError, IndexError):
+        return 0.0
+
+
+def _parse_list(answer_str: str) -> list:
+    """Parse a list answer via JSON/literal_eval with a delimiter fallback."""
+    try:
+        # Try JSON parsing first
+        if answer_str.startswith('['):
+            return json.loads(answer_str)
+        # Try ast.literal_eval
+        return ast.literal_eval(answer_str)
+    except (json.JSONDecodeError, ValueError, SyntaxError):
+        # Fallback: split by common delimiters
+        if ',' in answer_str:
+            return [item.strip() for item in answer_str.split(',')]
+        return [answer_str]
+
+
+def _parse_dict(answer_str: str) -> dict:
+    """Parse a dict answer via JSON/literal_eval with a wrapping fallback."""
+    try:
+        if answer_str.startswith('{'):
+            return json.loads(answer_str)
+        return ast.literal_eval(answer_str)
+    except (json.JSONDecodeError, ValueError, SyntaxError):
+        return {"value": answer_str}
+
+
+# Exact-hint dispatch: one hash lookup instead of walking an if/elif
+# ladder per answer. list/dict hints carry element types ("list[str]"),
+# so they are matched by prefix below.
+_HANDLERS = {
+    "int": _parse_int,
+    "float": _parse_float,
+}
 
 
 def parse_final_answer(answer_str: str, format_hint: str) -> Any:
     """
     Convert the final_answer string to the appropriate Python type based on format_hint.
-    
+
     Args:
         answer_str: The string answer from DSPy
         format_hint: The expected format/type (e.g., "int", "float", "list[str]", "dict")
-        
+
     Returns:
         Converted value in the appropriate type
     """
     answer_str = answer_str.strip()
-    
-    # Handle numeric types
-    if format_hint.lower() == "int":
-        try:
-            # Extract first number found if answer contains text
-            import re
-            numbers = re.findall(r'-?\d+', answer_str)
-            if numbers:
-                return int(numbers[0])
-            return int(answer_str)
-        except (ValueError, IndexError):
-            return 0
-    
-    elif format_hint.lower() == "float":
-        try:
-            import re
-            # Extract first float found
-            numbers = re.findall(r'-?\d+\.?\d*', answer_str)
-            if numbers:
-                return float(numbers[0])
-            return float(answer_str)
-        except (ValueError, IndexError):
-            return 0.0
-    
-    # Handle list types
-    elif "list" in format_hint.lower():
-        try:
-            # Try JSON parsing first
-            if answer_str.startswith('['):
-                return json.loads(answer_str)
-            # Try ast.literal_eval
-            return ast.literal_eval(answer_str)
-        except (json.JSONDecodeError, ValueError, SyntaxError):
-            # Fallback: split by common delimiters
-            if ',' in answer_str:
-                return [item.strip() for item in answer_str.split(',')]
-            return [answer_str]
-    
-    # Handle dict type
-    elif "dict" in format_hint.lower():
-        try:
-            if answer_str.startswith('{'):
-                return json.loads(answer_str)
-            return ast.literal_eval(answer_str)
-        except (json.JSONDecodeError, ValueError, SyntaxError):
-            return {"value": answer_str}
-    
+    fh = format_hint.lower().strip()
+
+    handler = _HANDLERS.get(fh)
+    if handler is not None:
+        return handler(answer_str)
+    if fh.startswith("list") or "list" in fh:
+        return _parse_list(answer_str)
+    if fh.startswith("dict") or "dict" in fh:
+        return _parse_dict(answer_str)
+
     # Default: return as string
     return answer_str
 
 
-def process_question(question_obj: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Process a single question through the agent graph.
-    
-    Args:
-        question_obj: Dictionary with 'id', 'question', and 'format_hint'
-        
-    Returns:
-        Result dictionary with required fields
-    """
-    # Initialize state
-    initial_state = {
-        "question": question_obj.get("question", ""),
-        "format_hint": question_obj.get("format_hint", "string"),
-        "sql_query": "",
-        "sql_result": {},
-        "retrieved_docs": [],
-        "final_answer": "",
-        "confidence": 0.0,
-        "explanation": "",
-        "citations": [],
-        "error_count": 0
-    }
-    
-    # Run the graph
-    try:
-        final_state = app.invoke(initial_state)
-    except Exception as e:
-        print(f"Error processing question {question_obj.get('id', 'unknown')}: {e}", file=sys.stderr)
-        final_state = initial_state
-        final_state["final_answer"] = f"Error: {str(e)}"
-        final_state["explanation"] = "An error occurred during processing."
-        final_state["confidence"] = 0.0
-    
-    # Parse final answer to correct type
+# Shared template for the graph's initial state: copied per question
+# instead of rebuilding (and re-hashing) the 10-key dict literal on every
+# call. Only immutable defaults live here; mutable containers are
+# replaced with fresh ones in _initial_state so questions never share them.
+_INITIAL_TEMPLATE = {
+    "question": "",
+    "format_hint": "string",
+    "sql_query": "",
+    "sql_result": None,
+    "retrieved_docs": None,
+    "final_answer": "",
+    "confidence": 0.0,
+    "explanation": "",
+    "citations": None,
+    "error_count": 0
+}
+
+
+def _initial_state(question_obj: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the graph's initial state for one question."""
+    state = _INITIAL_TEMPLATE.copy()
+    state["question"] = question_obj.get("question", "")
+    state["format_hint"] = question_obj.get("format_hint", "string")
+    state["sql_result"] = {}
+    state["retrieved_docs"] = []
+    state["citations"] = []
+    return state
+
+
+def _error_state(initial_state: Dict[str, Any], question_obj: Dict[str, Any], e: Exception) -> Dict[str, Any]:
+    """Turn a graph failure into a reportable final state."""
+    print(f"Error processing question {question_obj.get('id', 'unknown')}: {e}", file=sys.stderr)
+    initial_state["final_answer"] = f"Error: {str(e)}"
+    initial_state["explanation"] = "An error occurred during processing."
+    initial_state["confidence"] = 0.0
+    return initial_state
+
+
+def _build_result(question_obj: Dict[str, Any], final_state: Dict[str, Any]) -> Dict[str, Any]:
+    """Parse the final answer and shape the output record."""
     parsed_answer = parse_final_answer(
         final_state.get("final_answer", ""),
         question_obj.get("format_hint", "string")
     )
-    
-    # Construct output
-    result = {
+
+    return {
         "id": question_obj.get("id", "unknown"),
         "final_answer": parsed_answer,
         "sql": final_state.get("sql_query", ""),
@@ -129,11 +177,73 @@ def process_question(question_obj: Dict[str, Any]) -> Dict[str, Any]:
         "explanation": final_state.get("explanation", ""),
         "citations": final_state.get("citations", [])
     }
-    
-    return result
 
 
-def main():
+async def process_question(question_obj: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Process a single question through the agent graph.
+
+    Args:
+        question_obj: Dictionary with 'id', 'question', and 'format_hint'
+
+    Returns:
+        Result dictionary with required fields
+    """
+    initial_state = _initial_state(question_obj)
+
+    # Run the graph
+    try:
+        final_state = await app.ainvoke(initial_state)
+    except Exception as e:
+        final_state = _error_state(initial_state, question_obj, e)
+
+    return _build_result(question_obj, final_state)
+
+
+def process_question_sync(question_obj: Dict[str, Any]) -> Dict[str, Any]:
+    """Synchronous variant of process_question, for the thread-pool path."""
+    initial_state = _initial_state(question_obj)
+
+    try:
+        final_state = app.invoke(initial_state)
+    except Exception as e:
+        final_state = _error_state(initial_state, question_obj, e)
+
+    return _build_result(question_obj, final_state)
+
+
+def iter_threaded(questions: List[Dict[str, Any]], max_workers: int):
+    """
+    Process questions on a thread pool sharing one compiled app.
+
+    LLM and database calls release the GIL or block on I/O, so threads
+    overlap them. Results are yielded in input order as they become
+    available — a question that finishes early just waits in its future
+    until its turn — so the caller can stream them straight to disk.
+
+    Args:
+        questions: Parsed question objects
+        max_workers: Thread pool size
+
+    Yields:
+        One result record per question, in input order
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(process_question_sync, q) for q in questions]
+        for question_obj, fut in zip(questions, futures):
+            qid = question_obj.get('id', 'unknown')
+            try:
+                result = fut.result()
+                print(f"  ✓ Completed: {qid}", file=sys.stderr)
+            except Exception as e:
+                result = _build_result(
+                    question_obj,
+                    _error_state(_initial_state(question_obj), question_obj, e)
+                )
+            yield result
+
+
+async def main():
     """Main execution function."""
     parser = argparse.ArgumentParser(
         description="Run Retail Analytics AI Agent on batch questions"
@@ -148,43 +258,99 @@ def main():
         required=True,
         help="Path to output JSONL file for results"
     )
-    
+    parser.add_argument(
+        "--max-parallel",
+        type=int,
+        default=4,
+        help="Maximum number of questions processed concurrently (default: 4)"
+    )
+    parser.add_argument(
+        "--threads",
+        action="store_true",
+        help="Use a thread pool instead of asyncio (also the automatic "
+             "fallback when the graph has no async entrypoint)"
+    )
+
     args = parser.parse_args()
-    
+
     # Validate input file exists
     if not os.path.exists(args.batch):
         print(f"Error: Input file '{args.batch}' not found.", file=sys.stderr)
         sys.exit(1)
-    
-    # Process questions
-    results = []
+
+    # Arguments and input are valid — now pay for the heavy imports
+    global app
+    from agent.graph_hybrid import app
+    from agent.dspy_signatures import warmup
+
+    # Prefill the static prompt prefix into the llama-cpp KV cache before
+    # the batch starts, so the first question only prefills its variable
+    # suffix (no-op for server backends)
+    warmup()
+
+    # Read all questions first; each is independent, so they can run
+    # concurrently below
+    questions = []
     with open(args.batch, 'r', encoding='utf-8') as infile:
         for line_num, line in enumerate(infile, 1):
             line = line.strip()
             if not line:
                 continue
-            
+
             try:
-                question_obj = json.loads(line)
-                print(f"Processing question {question_obj.get('id', line_num)}...", file=sys.stderr)
-                
-                result = process_question(question_obj)
-                results.append(result)
-                
-                print(f"  ✓ Completed: {question_obj.get('id', line_num)}", file=sys.stderr)
-                
-            except json.JSONDecodeError as e:
+                questions.append(_loads(line))
+            except ValueError as e:  # JSONDecodeError and orjson errors
                 print(f"Error parsing line {line_num}: {e}", file=sys.stderr)
                 continue
-    
-    # Write results
-    with open(args.out, 'w', encoding='utf-8') as outfile:
-        for result in results:
-            outfile.write(json.dumps(result) + '\n')
-    
-    print(f"\n✓ Processed {len(results)} questions", file=sys.stderr)
+
+    # Process questions concurrently: asyncio by default, or a thread
+    # pool when requested (or when the graph lacks an async entrypoint).
+    # Either way at most --max-parallel graphs are in flight at once, and
+    # wall-clock drops from the sum of per-question latencies toward the
+    # slowest question's latency.
+    #
+    # Results are written as soon as each question (in input order) is
+    # done: memory stays bounded regardless of batch size, and a crash
+    # mid-run keeps everything finished so far on disk.
+    count = 0
+    with open(args.out, 'w', encoding='utf-8', buffering=1 << 20) as outfile:
+        if args.threads or not hasattr(app, "ainvoke"):
+            for result in iter_threaded(questions, args.max_parallel):
+                outfile.write(_dump_line(result) + '\n')
+                count += 1
+        else:
+            sem = asyncio.Semaphore(args.max_parallel)
+
+            async def run_one(question_obj: Dict[str, Any]) -> Dict[str, Any]:
+                async with sem:
+                    qid = question_obj.get('id', 'unknown')
+                    print(f"Processing question {qid}...", file=sys.stderr)
+                    result = await process_question(question_obj)
+                    print(f"  ✓ Completed: {qid}", file=sys.stderr)
+                    return result
+
+            # Tasks all start now (bounded by the semaphore); awaiting
+            # them in input order keeps the output aligned with the
+            # batch file while still streaming each result to disk
+            tasks = [asyncio.ensure_future(run_one(q)) for q in questions]
+            for question_obj, task in zip(questions, tasks):
+                try:
+                    result = await task
+                except Exception as e:
+                    result = {
+                        "id": question_obj.get("id", "unknown"),
+                        "final_answer": f"Error: {e}",
+                        "sql": "",
+                        "confidence": 0.0,
+                        "explanation": "An error occurred during processing.",
+                        "citations": []
+                    }
+                outfile.write(_dump_line(result) + '\n')
+                count += 1
+
+    print(f"\n✓ Processed {count} questions", file=sys.stderr)
     print(f"✓ Results written to: {args.out}", file=sys.stderr)
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
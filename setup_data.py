@@ -19,10 +19,11 @@ def create_evaluation_dataset():
         {"id":"hybrid_best_customer_margin_1997","question":"Per the KPI definition of gross margin, who was the top customer by gross margin in 1997? Assume CostOfGoods is approximated by 70% of UnitPrice if not available. Return {customer:str, margin:float}.","format_hint":"{customer:str, margin:float}"}
     ]
     
-    # Write to JSONL file
+    # Write to JSONL file: one buffer, one write call; compact
+    # separators drop insignificant whitespace from every record
     with open("sample_questions_hybrid_eval.jsonl", "w", encoding="utf-8") as f:
-        for question in questions:
-            f.write(json.dumps(question) + "\n")
+        f.write('\n'.join(json.dumps(q, separators=(',', ':')) for q in questions))
+        f.write('\n')
     
     print("=" * 70)
     print("✓✓✓ Evaluation dataset created successfully! ✓✓✓")
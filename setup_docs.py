@@ -4,17 +4,11 @@ Setup script to create the required documentation files in the docs/ folder.
 """
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 
-def create_docs():
-    """Create the docs directory and write all required documentation files."""
-    
-    # Ensure docs directory exists
-    os.makedirs("docs", exist_ok=True)
-    print("✓ Created/verified docs/ directory")
-    
-    # File 1: marketing_calendar.md
-    marketing_calendar = """# Northwind Marketing Calendar (1997)
+# File 1: marketing_calendar.md
+marketing_calendar = """# Northwind Marketing Calendar (1997)
 ## Summer Beverages 1997
 - Dates: 1997-06-01 to 1997-06-30
 - Notes: Focus on Beverages and Condiments.
@@ -22,53 +16,88 @@ def create_docs():
 - Dates: 1997-12-01 to 1997-12-31
 - Notes: Push Dairy Products and Confections for holiday gifting.
 """
-    
-    with open("docs/marketing_calendar.md", "w", encoding="utf-8") as f:
-        f.write(marketing_calendar)
-    print("✓ Created docs/marketing_calendar.md")
-    
-    # File 2: kpi_definitions.md
-    kpi_definitions = """# KPI Definitions
+
+# File 2: kpi_definitions.md
+kpi_definitions = """# KPI Definitions
 ## Average Order Value (AOV)
 - AOV = SUM(UnitPrice * Quantity * (1 - Discount)) / COUNT(DISTINCT OrderID)
 ## Gross Margin
 - GM = SUM((UnitPrice - CostOfGoods) * Quantity * (1 - Discount))
 - If cost is missing, approximate with category-level average (document your approach).
 """
-    
-    with open("docs/kpi_definitions.md", "w", encoding="utf-8") as f:
-        f.write(kpi_definitions)
-    print("✓ Created docs/kpi_definitions.md")
-    
-    # File 3: catalog.md
-    catalog = """# Catalog Snapshot
+
+# File 3: catalog.md
+catalog = """# Catalog Snapshot
 - Categories include Beverages, Condiments, Confections, Dairy Products, Grains/Cereals, Meat/Poultry, Produce, Seafood.
 - Products map to categories as in the Northwind DB.
 """
-    
-    with open("docs/catalog.md", "w", encoding="utf-8") as f:
-        f.write(catalog)
-    print("✓ Created docs/catalog.md")
-    
-    # File 4: product_policy.md
-    product_policy = """# Returns & Policy
+
+# File 4: product_policy.md
+product_policy = """# Returns & Policy
 - Perishables (Produce, Seafood, Dairy): 3–7 days.
 - Beverages unopened: 14 days; opened: no returns.
 - Non-perishables: 30 days.
 """
-    
-    with open("docs/product_policy.md", "w", encoding="utf-8") as f:
-        f.write(product_policy)
-    print("✓ Created docs/product_policy.md")
-    
+
+_FILES = [
+    ("docs/marketing_calendar.md", marketing_calendar),
+    ("docs/kpi_definitions.md", kpi_definitions),
+    ("docs/catalog.md", catalog),
+    ("docs/product_policy.md", product_policy),
+]
+
+
+def _write_if_changed(path, body):
+    """
+    Write body to path unless the file already holds exactly that content.
+
+    Skipping the no-op rewrite avoids needless writeback and keeps the
+    file's mtime stable, so mtime-keyed caches (like the retriever's
+    pickled BM25 index) stay valid across repeat runs.
+
+    Args:
+        path: Destination file path
+        body: Full file content
+
+    Returns:
+        True if the file was (re)written, False if it was already current
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read() == body:
+                return False
+    except FileNotFoundError:
+        pass
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(body)
+    return True
+
+
+def create_docs():
+    """Create the docs directory and write all required documentation files."""
+
+    # Ensure docs directory exists
+    os.makedirs("docs", exist_ok=True)
+    print("✓ Created/verified docs/ directory")
+
+    # Write the four files in parallel to overlap disk latency; each
+    # reports whether it actually changed
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        changed = list(executor.map(lambda t: _write_if_changed(*t), _FILES))
+
+    for (path, _), was_written in zip(_FILES, changed):
+        if was_written:
+            print(f"✓ Created {path}")
+        else:
+            print(f"✓ Unchanged {path}")
+
     print("\n" + "=" * 60)
     print("✓✓✓ All documentation files created successfully! ✓✓✓")
     print("=" * 60)
     print("\nCreated files:")
-    print("  - docs/marketing_calendar.md")
-    print("  - docs/kpi_definitions.md")
-    print("  - docs/catalog.md")
-    print("  - docs/product_policy.md")
+    for path, _ in _FILES:
+        print(f"  - {path}")
 
 
 if __name__ == "__main__":
@@ -11,8 +11,23 @@ if os.path.exists(db_path):
     os.remove(db_path)
 
 conn = sqlite3.connect(db_path)
+conn.isolation_level = None  # we manage the transaction explicitly below
 cursor = conn.cursor()
 
+# Build-time PRAGMAs: the database is scratch-rebuilt from nothing every
+# run (the file was just removed), so crash durability during the load
+# buys nothing — turn journaling, syncs and FK checks off while loading.
+# Safe settings are restored below before the file is handed to the agent.
+cursor.execute("PRAGMA journal_mode=OFF")
+cursor.execute("PRAGMA synchronous=OFF")
+cursor.execute("PRAGMA foreign_keys=OFF")
+cursor.execute("PRAGMA temp_store=MEMORY")
+cursor.execute("PRAGMA locking_mode=EXCLUSIVE")
+
+# One explicit transaction around all DDL and inserts: a single commit
+# instead of an autocommit boundary (and its journal write) per statement
+cursor.execute("BEGIN")
+
 # Create Orders table
 cursor.execute("""
 CREATE TABLE Orders (
@@ -125,10 +140,23 @@ order_details_data = [
     (10264, 4, 13, 22.00),
     (10265, 5, 10, 25.00),
 ]
-for detail in order_details_data:
-    cursor.execute("INSERT INTO [Order Details] (OrderID, ProductID, Quantity, UnitPrice) VALUES (?, ?, ?, ?)", detail)
+cursor.executemany("INSERT INTO [Order Details] (OrderID, ProductID, Quantity, UnitPrice) VALUES (?, ?, ?, ?)", order_details_data)
+
+# Indexes for the hot predicates: OrderDate range filters (dates are
+# ISO-8601 text, so lexical order is chronological and range queries can
+# seek instead of scanning) and the Order Details join keys. Built after
+# the inserts so the load doesn't maintain them row by row.
+cursor.execute("CREATE INDEX idx_orders_date ON Orders(OrderDate)")
+cursor.execute("CREATE INDEX idx_order_details_orderid ON [Order Details](OrderID)")
+cursor.execute("CREATE INDEX idx_order_details_productid ON [Order Details](ProductID)")
+
+cursor.execute("COMMIT")
 
-conn.commit()
+# The load is done — put the file back into the safe configuration the
+# agent runs against (PRAGMA journal_mode must run outside a transaction)
+cursor.execute("PRAGMA locking_mode=NORMAL")
+cursor.execute("PRAGMA journal_mode=WAL")
+cursor.execute("PRAGMA synchronous=NORMAL")
 
 # Verify data
 cursor.execute("SELECT COUNT(*) FROM Orders WHERE strftime('%Y', OrderDate) = '1997'")